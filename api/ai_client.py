@@ -1,8 +1,19 @@
 import os
+import json
 import logging
 import html
+import threading
+import time
+from collections import deque
 from typing import Dict, Any, Optional
 
+try:
+    from api.request_timing import span
+    from api.settings import env_number
+except ImportError:
+    from request_timing import span
+    from settings import env_number
+
 # Configure minimal logging
 log_level = os.environ.get('LOG_LEVEL', 'WARNING')
 logging.basicConfig(level=getattr(logging, log_level, logging.WARNING))
@@ -12,6 +23,17 @@ logger = logging.getLogger(__name__)
 AI_API_KEY = os.environ.get('AI_API_KEY', '')
 AI_MODEL = os.environ.get('AI_MODEL', 'nae1/eva')  # Default to your model
 
+# Keep-warm settings: periodically probe the model so serverless providers
+# do not unload it between chats (disabled by default to save API quota)
+KEEP_WARM_ENABLED = os.environ.get('AI_KEEP_WARM', 'false').lower() in ('1', 'true', 'yes')
+KEEP_WARM_MIN_INTERVAL = env_number('AI_KEEP_WARM_MIN_INTERVAL', 60, minimum=1)
+KEEP_WARM_MAX_INTERVAL = env_number('AI_KEEP_WARM_MAX_INTERVAL', 900, minimum=1)
+if KEEP_WARM_MIN_INTERVAL > KEEP_WARM_MAX_INTERVAL:
+    logger.warning("AI_KEEP_WARM_MIN_INTERVAL is larger than AI_KEEP_WARM_MAX_INTERVAL, swapping them")
+    KEEP_WARM_MIN_INTERVAL, KEEP_WARM_MAX_INTERVAL = KEEP_WARM_MAX_INTERVAL, KEEP_WARM_MIN_INTERVAL
+KEEP_WARM_QUIET_HOURS = os.environ.get('AI_KEEP_WARM_QUIET_HOURS', '')  # e.g. "23-7"
+COLD_START_SECONDS = env_number('AI_COLD_START_SECONDS', 10, minimum=0.5)
+
 # Try to import InferenceClient for better model support
 try:
     from huggingface_hub import InferenceClient
@@ -52,7 +74,8 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
         raise ValueError("Prompt too long (max 2000 characters)")
     
     # Sanitize prompt to prevent injection
-    prompt = html.escape(prompt)
+    with span('sanitize'):
+        prompt = html.escape(prompt)
     
     # Validate max_tokens
     if not isinstance(max_tokens, int) or max_tokens < 1 or max_tokens > 2000:
@@ -61,7 +84,8 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
     try:
         if HF_CLIENT_AVAILABLE:
             # Use InferenceClient for Inference Providers support
-            client = InferenceClient(api_key=AI_API_KEY)
+            with span('client'):
+                client = InferenceClient(api_key=AI_API_KEY)
             response_text = None
             
             # If image provided, try vision-language tasks first
@@ -71,7 +95,10 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
                 # Try image_to_text (good for caption/description models)
                 try:
                     logger.debug("Trying image_to_text...")
-                    result = client.image_to_text(image=image_bytes, model=AI_MODEL)
+                    attempt_started = time.monotonic()
+                    with span('image_to_text', 'ok'):
+                        result = client.image_to_text(image=image_bytes, model=AI_MODEL)
+                    attempt_seconds = time.monotonic() - attempt_started
                     response_text = result if isinstance(result, str) else str(result)
                     logger.debug("image_to_text succeeded")
                 except Exception as e:
@@ -81,7 +108,10 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
                 if not response_text:
                     try:
                         logger.debug(f"Trying visual_question_answering with question: {prompt[:50]}...")
-                        result = client.visual_question_answering(image=image_bytes, question=prompt, model=AI_MODEL)
+                        attempt_started = time.monotonic()
+                        with span('visual_question_answering', 'ok'):
+                            result = client.visual_question_answering(image=image_bytes, question=prompt, model=AI_MODEL)
+                        attempt_seconds = time.monotonic() - attempt_started
                         if isinstance(result, dict):
                             response_text = result.get('answer') or str(result)
                         elif isinstance(result, list) and len(result) > 0:
@@ -101,13 +131,16 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
             if not response_text:
                 try:
                     logger.debug(f"Attempting text_generation on {AI_MODEL}")
-                    result = client.text_generation(
-                        prompt=prompt,
-                        model=AI_MODEL,
-                        max_new_tokens=max_tokens,
-                        temperature=0.7,
-                        do_sample=True
-                    )
+                    attempt_started = time.monotonic()
+                    with span('text_generation', 'ok'):
+                        result = client.text_generation(
+                            prompt=prompt,
+                            model=AI_MODEL,
+                            max_new_tokens=max_tokens,
+                            temperature=0.7,
+                            do_sample=True
+                        )
+                    attempt_seconds = time.monotonic() - attempt_started
                     response_text = result if isinstance(result, str) else str(result)
                     logger.debug("text_generation succeeded")
                 except Exception as tg_err:
@@ -115,12 +148,15 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
                     # Last resort: try chat_completion
                     try:
                         logger.debug(f"Attempting chat_completion on {AI_MODEL}")
-                        result = client.chat_completion(
-                            messages=[{"role": "user", "content": prompt}],
-                            model=AI_MODEL,
-                            max_tokens=max_tokens,
-                            temperature=0.7
-                        )
+                        attempt_started = time.monotonic()
+                        with span('chat_completion', 'ok'):
+                            result = client.chat_completion(
+                                messages=[{"role": "user", "content": prompt}],
+                                model=AI_MODEL,
+                                max_tokens=max_tokens,
+                                temperature=0.7
+                            )
+                        attempt_seconds = time.monotonic() - attempt_started
                         if result and hasattr(result, 'choices') and len(result.choices) > 0:
                             response_text = result.choices[0].message.content
                         else:
@@ -142,7 +178,10 @@ def process_ai_request(prompt: str, max_tokens: int = 500, image_bytes: Optional
             if not response_text:
                 raise ValueError("No response from model")
             
-            return format_response(response_text)
+            # Only the successful attempt counts; failed fallbacks say nothing about model load
+            record_model_latency(attempt_seconds, tokens=max(1, len(response_text) // 4))
+            with span('format'):
+                return format_response(response_text)
         
         else:
             raise ValueError("HuggingFace SDK not installed. Install with: pip install huggingface_hub")
@@ -175,6 +214,264 @@ def format_response(text: str) -> Dict[str, Any]:
         "format": "text"
     }
 
+# Keep-warm state, shared between request handlers and the background probe
+_keep_warm_lock = threading.Lock()
+_keep_warm_stop = threading.Event()
+_keep_warm_thread = None
+_keep_warm_state = {
+    'interval': KEEP_WARM_MIN_INTERVAL,
+    'last_activity': None,  # monotonic time of the last successful model call
+    # Recent seconds per generated token; the fastest one is the warm baseline,
+    # since cold starts can only make a call slower
+    'samples': {'probe': deque(maxlen=20), 'request': deque(maxlen=20)},
+    'requests': 0,
+    'classified_requests': 0,
+    'cold_requests': 0,
+    'probes': 0,
+    'cold_probes': 0,
+    'failed_probes': 0,
+    'skipped_probes': 0,
+    'probe_seconds': 0.0,
+    'probe_method': None,  # upstream call that last answered a probe
+}
+
+def _is_cold(seconds: float, tokens: int, kind: str) -> Optional[bool]:
+    """
+    Classify a call as a cold start from its delay beyond the expected generation time.
+
+    The expected time is the token count times the fastest recent seconds per
+    token, so long answers are not mistaken for cold starts. Probes always
+    generate one token and fall back to the raw latency until a baseline
+    exists; real requests stay unclassified (None) until then.
+    """
+    samples = _keep_warm_state['samples'][kind]
+    if len(samples) < 3:
+        if kind == 'request':
+            return None
+        return seconds >= COLD_START_SECONDS
+    overhead = seconds - tokens * min(samples)
+    return overhead >= COLD_START_SECONDS
+
+def record_model_latency(seconds: float, probe: bool = False, tokens: int = 1) -> Optional[bool]:
+    """
+    Record a successful model call and adapt the keep-warm interval.
+
+    Only probes (a fixed 1-token request) change the interval: a cold probe
+    after an idle gap means the provider unloads sooner than we probe, so the
+    interval is halved (bounded by that gap); a warm probe lets it grow again.
+    Real requests are counted for the cold-start rate and reset the idle timer.
+    
+    Args:
+        seconds: Duration of the successful attempt only
+        probe: True for keep-warm probes
+        tokens: Approximate number of generated tokens
+        
+    Returns:
+        True if the call was a cold start, None if it could not be classified yet
+    """
+    kind = 'probe' if probe else 'request'
+    tokens = max(1, int(tokens))
+    now = time.monotonic()
+    with _keep_warm_lock:
+        state = _keep_warm_state
+        cold = _is_cold(seconds, tokens, kind)
+        state['samples'][kind].append(seconds / tokens)
+
+        if probe:
+            idle_gap = now - seconds - state['last_activity'] if state['last_activity'] else None
+            if cold:
+                interval = state['interval'] if idle_gap is None else min(state['interval'], idle_gap)
+                state['interval'] = max(KEEP_WARM_MIN_INTERVAL, interval / 2)
+            else:
+                state['interval'] = min(KEEP_WARM_MAX_INTERVAL, state['interval'] * 1.5)
+            state['probes'] += 1
+            state['cold_probes'] += int(bool(cold))
+            state['probe_seconds'] += seconds
+        else:
+            state['requests'] += 1
+            if cold is not None:
+                state['classified_requests'] += 1
+                state['cold_requests'] += int(cold)
+        state['last_activity'] = now
+    return cold
+
+def get_keep_warm_stats() -> Dict[str, Any]:
+    """Return keep-warm counters for tuning probe cost against cold-start rate"""
+    with _keep_warm_lock:
+        state = _keep_warm_state
+        classified = state['classified_requests']
+        samples = state['samples']
+        return {
+            'enabled': KEEP_WARM_ENABLED,
+            'running': _keep_warm_thread is not None and _keep_warm_thread.is_alive(),
+            'interval': state['interval'],
+            'idle_seconds': time.monotonic() - state['last_activity'] if state['last_activity'] else None,
+            'warm_probe_seconds': min(samples['probe']) if samples['probe'] else None,
+            'warm_seconds_per_token': min(samples['request']) if samples['request'] else None,
+            'requests': state['requests'],
+            'classified_requests': classified,
+            'cold_requests': state['cold_requests'],
+            'cold_start_rate': state['cold_requests'] / classified if classified else None,
+            'probes': state['probes'],
+            'cold_probes': state['cold_probes'],
+            'failed_probes': state['failed_probes'],
+            'skipped_probes': state['skipped_probes'],
+            'probe_seconds': round(state['probe_seconds'], 3),
+            'probe_method': state['probe_method'],
+        }
+
+def _in_quiet_hours(hour: Optional[int] = None) -> bool:
+    """Check the local hour against AI_KEEP_WARM_QUIET_HOURS ("start-end", may wrap midnight)"""
+    if not KEEP_WARM_QUIET_HOURS:
+        return False
+    try:
+        start, end = (int(h) % 24 for h in KEEP_WARM_QUIET_HOURS.split('-'))
+    except ValueError:
+        logger.warning(f"Invalid AI_KEEP_WARM_QUIET_HOURS: {KEEP_WARM_QUIET_HOURS}")
+        return False
+    if hour is None:
+        hour = time.localtime().tm_hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+def _send_probe() -> float:
+    """
+    Send the smallest possible request to load (or keep) the model in memory.
+
+    The method that last worked is tried first, so chat-only models do not
+    pay for a failing text_generation call on every probe.
+    
+    Returns:
+        Duration of the successful call only
+    """
+    client = InferenceClient(api_key=AI_API_KEY)
+    methods = ['text_generation', 'chat_completion']
+    with _keep_warm_lock:
+        preferred = _keep_warm_state['probe_method']
+    if preferred in methods:
+        methods.remove(preferred)
+        methods.insert(0, preferred)
+
+    error = None
+    for method in methods:
+        started = time.monotonic()
+        try:
+            if method == 'text_generation':
+                client.text_generation(prompt="ping", model=AI_MODEL, max_new_tokens=1)
+            else:
+                client.chat_completion(
+                    messages=[{"role": "user", "content": "ping"}],
+                    model=AI_MODEL,
+                    max_tokens=1
+                )
+        except Exception as e:
+            logger.debug(f"{method} probe failed: {e}")
+            error = e
+            continue
+        seconds = time.monotonic() - started
+        with _keep_warm_lock:
+            _keep_warm_state['probe_method'] = method
+        return seconds
+    raise error
+
+def _keep_warm_loop() -> None:
+    """Probe at startup, then whenever the model has been idle for the current interval"""
+    delay = 0.0
+    while not _keep_warm_stop.wait(delay):
+        with _keep_warm_lock:
+            interval = _keep_warm_state['interval']
+            last_activity = _keep_warm_state['last_activity']
+
+        if _in_quiet_hours():
+            # Let the model unload overnight; check again at the slowest rate
+            delay = KEEP_WARM_MAX_INTERVAL
+            continue
+
+        if last_activity is not None:
+            idle = time.monotonic() - last_activity
+            if idle < interval:
+                # Real traffic kept the model warm, no probe needed yet
+                with _keep_warm_lock:
+                    _keep_warm_state['skipped_probes'] += 1
+                delay = interval - idle
+                continue
+
+        started = time.monotonic()
+        try:
+            seconds = _send_probe()
+            cold = record_model_latency(seconds, probe=True)
+            with _keep_warm_lock:
+                # Failed fallback calls say nothing about model load, but still cost
+                _keep_warm_state['probe_seconds'] += time.monotonic() - started - seconds
+            logger.debug(f"Keep-warm probe took {seconds:.2f}s (cold={cold})")
+        except Exception as e:
+            with _keep_warm_lock:
+                _keep_warm_state['failed_probes'] += 1
+                _keep_warm_state['probe_seconds'] += time.monotonic() - started
+                # Back off so a model the provider cannot serve does not cost a call every minute
+                _keep_warm_state['interval'] = min(KEEP_WARM_MAX_INTERVAL, _keep_warm_state['interval'] * 2)
+                logger.warning(f"Keep-warm probe failed, next attempt in {_keep_warm_state['interval']:.0f}s: {e}")
+
+        with _keep_warm_lock:
+            delay = _keep_warm_state['interval']
+
+def _restore_keep_warm_state(previous_state: str) -> None:
+    """
+    Continue from a previous worker's /api/ai-keep-warm snapshot (JSON).
+
+    Counters and the interval carry over, and the last activity time is
+    restored, so a model that was warm is not probed again at startup.
+    """
+    try:
+        stats = json.loads(previous_state)
+        idle = stats.get('idle_seconds')
+        if idle is not None:
+            idle += max(0.0, time.time() - float(stats.get('snapshot_time', time.time())))
+        with _keep_warm_lock:
+            state = _keep_warm_state
+            for key in ('requests', 'classified_requests', 'cold_requests', 'probes',
+                        'cold_probes', 'failed_probes', 'skipped_probes'):
+                state[key] = int(stats.get(key) or 0)
+            state['probe_seconds'] = float(stats.get('probe_seconds') or 0.0)
+            state['probe_method'] = stats.get('probe_method')
+            state['interval'] = min(KEEP_WARM_MAX_INTERVAL,
+                                    max(KEEP_WARM_MIN_INTERVAL, float(stats.get('interval') or 0)))
+            if stats.get('warm_probe_seconds'):
+                state['samples']['probe'].append(float(stats['warm_probe_seconds']))
+            if stats.get('warm_seconds_per_token'):
+                state['samples']['request'].append(float(stats['warm_seconds_per_token']))
+            if idle is not None:
+                state['last_activity'] = time.monotonic() - float(idle)
+    except (TypeError, ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring previous keep-warm state: {e}")
+
+def start_keep_warm(previous_state: Optional[str] = None) -> bool:
+    """
+    Start the background keep-warm probe if enabled and configured.
+    
+    Args:
+        previous_state: JSON stats handed over by the supervisor on reload
+        
+    Returns:
+        True if the probe thread is running
+    """
+    global _keep_warm_thread
+    if not KEEP_WARM_ENABLED or not AI_API_KEY or not AI_MODEL or not HF_CLIENT_AVAILABLE:
+        return False
+    if _keep_warm_thread is not None and _keep_warm_thread.is_alive():
+        return True
+    if previous_state:
+        _restore_keep_warm_state(previous_state)
+    _keep_warm_stop.clear()
+    _keep_warm_thread = threading.Thread(target=_keep_warm_loop, name='ai-keep-warm', daemon=True)
+    _keep_warm_thread.start()
+    return True
+
+def stop_keep_warm() -> None:
+    """Stop the background keep-warm probe"""
+    _keep_warm_stop.set()
+
 # Example usage function
 def example_usage():
     """Example of how to use the AI client"""
@@ -0,0 +1,108 @@
+import os
+import time
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+try:
+    from api.settings import env_number
+except ImportError:
+    from settings import env_number
+
+log_level = os.environ.get('LOG_LEVEL', 'WARNING')
+logging.basicConfig(level=getattr(logging, log_level, logging.WARNING))
+logger = logging.getLogger(__name__)
+
+# Per-request phase timing, returned to the browser as a Server-Timing header
+REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING', 'true').lower() in ('1', 'true', 'yes')
+SLOW_REQUEST_MS = env_number('SLOW_REQUEST_MS', 5000, minimum=0)
+SLOW_REQUEST_LOG_SIZE = env_number('SLOW_REQUEST_LOG_SIZE', 50, cast=int, minimum=1)
+
+# Bounded so the slow-request log never grows on a Pi Zero
+_slow_requests = deque(maxlen=SLOW_REQUEST_LOG_SIZE)
+_current_trace = contextvars.ContextVar('request_trace', default=None)
+
+class RequestTrace:
+    """Spans recorded for a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name: str, duration_ms: float, desc: Optional[str] = None) -> None:
+        self.spans.append({'name': name, 'dur': round(duration_ms, 2), 'desc': desc})
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+def start_trace() -> Optional[RequestTrace]:
+    """Begin tracing the current request (no-op when REQUEST_TIMING is off)"""
+    if not REQUEST_TIMING_ENABLED:
+        return None
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+def end_trace() -> Optional[RequestTrace]:
+    """Detach and return the current trace"""
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+@contextmanager
+def span(name: str, desc: Optional[str] = None):
+    """
+    Time a block as a phase of the current request.
+
+    Outside a traced request this does nothing. If the block raises, the span
+    is recorded with desc "failed" and the exception propagates.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = desc
+    try:
+        yield
+    except Exception:
+        outcome = 'failed'
+        raise
+    finally:
+        trace.add(name, (time.perf_counter() - start) * 1000, outcome)
+
+def server_timing_header(trace: RequestTrace, total_ms: float) -> str:
+    """Format spans as a Server-Timing header value"""
+    parts = []
+    for s in trace.spans:
+        part = f"{s['name']};dur={s['dur']}"
+        if s['desc']:
+            desc = str(s['desc']).replace('\\', '').replace('"', "'")
+            part += f';desc="{desc}"'
+        parts.append(part)
+    parts.append(f"total;dur={round(total_ms, 2)}")
+    return ', '.join(parts)
+
+def record_if_slow(trace: RequestTrace, total_ms: float, method: str, path: str, status: int) -> bool:
+    """Add the request to the slow-request log if it exceeded SLOW_REQUEST_MS"""
+    if total_ms < SLOW_REQUEST_MS:
+        return False
+    _slow_requests.append({
+        'timestamp': time.time(),
+        'method': method,
+        'path': path,
+        'status': status,
+        'duration_ms': round(total_ms, 2),
+        'spans': list(trace.spans)
+    })
+    logger.info(f"Slow request {method} {path} took {total_ms:.0f}ms")
+    return True
+
+def get_slow_requests() -> List[Dict[str, Any]]:
+    """Return logged slow requests, newest first"""
+    return list(reversed(_slow_requests))
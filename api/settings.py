@@ -0,0 +1,28 @@
+import os
+import logging
+
+log_level = os.environ.get('LOG_LEVEL', 'WARNING')
+logging.basicConfig(level=getattr(logging, log_level, logging.WARNING))
+logger = logging.getLogger(__name__)
+
+def env_number(name: str, default, cast=float, minimum=None):
+    """
+    Read a numeric setting from the environment.
+
+    Optional features must not stop the dashboard from starting, so a value
+    that does not parse or is below minimum is logged and replaced by default.
+    
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset or invalid
+        cast: float or int
+        minimum: Smallest accepted value (inclusive), or None
+    """
+    try:
+        value = cast(os.environ.get(name, default))
+        if minimum is None or value >= minimum:
+            return value
+    except (TypeError, ValueError):
+        pass
+    logger.warning(f"Invalid value for {name}, using {default}")
+    return cast(default)
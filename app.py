@@ -24,6 +24,10 @@ app.config['SECRET_KEY'] = secret_key
 # Increase max content size to allow small image uploads (2MB)
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB max request size
 
+from api.request_timing import (
+    span, start_trace, end_trace, server_timing_header, record_if_slow, get_slow_requests
+)
+
 # Import modules (will be implemented in separate files)
 try:
     from api.system_stats import get_system_stats
@@ -36,12 +40,30 @@ except ImportError:
 miner_stats_available = False
 
 try:
-    from api.ai_client import process_ai_request
+    from api.ai_client import process_ai_request, start_keep_warm, stop_keep_warm, get_keep_warm_stats
     ai_client_available = True
+    # Optional background probe that keeps the cloud model loaded (AI_KEEP_WARM).
+    # Workers started by supervisor.py continue from the previous worker's state.
+    start_keep_warm(os.environ.get('MINERVA_KEEP_WARM_STATE'))
 except ImportError:
     logger.warning("AI client module not available")
     ai_client_available = False
 
+@app.before_request
+def begin_request_timing():
+    """Start recording phase timings for this request"""
+    start_trace()
+
+@app.after_request
+def add_server_timing(response):
+    """Expose phase timings via Server-Timing and log slow requests"""
+    trace = end_trace()
+    if trace is not None:
+        total_ms = trace.elapsed_ms()
+        response.headers['Server-Timing'] = server_timing_header(trace, total_ms)
+        record_if_slow(trace, total_ms, request.method, request.path, response.status_code)
+    return response
+
 @app.route('/')
 def dashboard():
     """Serve the main dashboard page"""
@@ -88,6 +110,18 @@ def health_check():
         }
     })
 
+@app.route('/api/ai-keep-warm')
+def ai_keep_warm():
+    """API endpoint for keep-warm probe cost and cold-start statistics"""
+    if not ai_client_available:
+        return jsonify({"enabled": False}), 200
+    return jsonify(get_keep_warm_stats())
+
+@app.route('/api/slow-requests')
+def slow_requests():
+    """API endpoint for recent requests slower than SLOW_REQUEST_MS"""
+    return jsonify(get_slow_requests())
+
 @app.route('/favicon.ico')
 def favicon():
     """Serve favicon"""
@@ -104,17 +138,18 @@ def chat():
         user_message = None
         image_bytes = None
 
-        if request.content_type and request.content_type.startswith('multipart/form-data'):
-            # Multipart form with optional image
-            user_message = (request.form.get('message') or '').strip()
-            image_file = request.files.get('image')
-            if image_file:
-                image_bytes = image_file.read()
-        else:
-            data = request.get_json()
-            if not data:
-                return jsonify({"error": "Invalid JSON"}), 400
-            user_message = (data.get('message', '') or '').strip()
+        with span('parse'):
+            if request.content_type and request.content_type.startswith('multipart/form-data'):
+                # Multipart form with optional image
+                user_message = (request.form.get('message') or '').strip()
+                image_file = request.files.get('image')
+                if image_file:
+                    image_bytes = image_file.read()
+            else:
+                data = request.get_json()
+                if not data:
+                    return jsonify({"error": "Invalid JSON"}), 400
+                user_message = (data.get('message', '') or '').strip()
 
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
@@ -125,7 +160,8 @@ def chat():
 
         # Process the AI request (pass image bytes if provided)
         response = process_ai_request(user_message, image_bytes=image_bytes)
-        return jsonify({"response": response})
+        with span('serialize'):
+            return jsonify({"response": response})
     except ValueError as e:
         # Return 200 with message instead of 503 for better UX
         logger.warning(f"AI service unavailable: {e}")
@@ -135,6 +171,12 @@ def chat():
         return jsonify({"response": "Error processing your message. Please try again."}), 200
 
 if __name__ == '__main__':
+    if os.environ.get('MINERVA_LISTEN_FD'):
+        # Started by supervisor.py: serve the inherited socket instead of binding
+        from supervisor import run_worker
+        run_worker(app, on_stop=stop_keep_warm if ai_client_available else None)
+        raise SystemExit(0)
+
     # Run with minimal configuration for Raspberry Pi Zero
     # Use single-threaded server to reduce memory/CPU overhead on Pi Zero W
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=False, use_reloader=False)
\ No newline at end of file
@@ -6,8 +6,16 @@ Simple management script for Raspberry Pi Server Dashboard
 
 import argparse
 import subprocess
+import signal
 import sys
 import os
+from dotenv import load_dotenv
+
+# Load environment variables before importing modules that read them
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'settings.env'))
+
+from api.settings import env_number
+from supervisor import DashboardSupervisor, read_pid_file
 
 def run_command(cmd, error_msg):
     """Run a command and handle errors"""
@@ -35,6 +43,10 @@ def stop_service():
 
 def restart_service():
     """Restart the dashboard service"""
+    # Prefer a zero-downtime reload when the supervisor is running
+    if read_pid_file() is not None:
+        reload_service()
+        return
     if run_command(['sudo', 'systemctl', 'restart', 'rpi-dashboard.service'],
                    "Failed to restart dashboard service"):
         print("Dashboard service restarted")
@@ -44,6 +56,39 @@ def status_service():
     run_command(['sudo', 'systemctl', 'status', 'rpi-dashboard.service'],
                 "Failed to get service status")
 
+def supervise_service(args):
+    """Run the dashboard under the worker supervisor in the foreground"""
+    try:
+        supervisor = DashboardSupervisor(
+            host=args.host,
+            port=args.port,
+            drain_timeout=args.drain_timeout,
+            startup_timeout=args.startup_timeout
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    try:
+        supervisor.bind()
+    except OSError as e:
+        print(f"Error: cannot listen on {args.host}:{args.port}: {e}")
+        print("Is another dashboard (e.g. a standalone app.py) already running?")
+        sys.exit(1)
+    print(f"Supervisor listening on {args.host}:{args.port} (PID: {os.getpid()})")
+    supervisor.run()
+
+def reload_service():
+    """Ask the running supervisor to replace its worker without downtime"""
+    pid = read_pid_file()
+    if pid is None:
+        print("Supervisor is not running")
+        return
+    try:
+        os.kill(pid, signal.SIGHUP)
+        print(f"Reload requested (supervisor PID: {pid})")
+    except OSError as e:
+        print(f"Failed to signal supervisor: {e}")
+
 def setup_service():
     """Setup the systemd service"""
     service_file = 'services/rpi-dashboard.service'
@@ -78,6 +123,17 @@ def main():
     subparsers.add_parser('restart', help='Restart the dashboard service')
     subparsers.add_parser('status', help='Check the status of the dashboard service')
     subparsers.add_parser('setup', help='Setup the systemd service')
+    subparsers.add_parser('reload', help='Replace the supervised worker without downtime')
+
+    supervise = subparsers.add_parser('supervise', help='Run the dashboard under the worker supervisor')
+    supervise.add_argument('--host', default=os.environ.get('SUPERVISOR_HOST', '0.0.0.0'))
+    supervise.add_argument('--port', type=int, default=env_number('SUPERVISOR_PORT', 5000, cast=int, minimum=1))
+    supervise.add_argument('--drain-timeout', type=float,
+                           default=env_number('SUPERVISOR_DRAIN_TIMEOUT', 30, minimum=1),
+                           help='Seconds an old worker may spend finishing in-flight requests')
+    supervise.add_argument('--startup-timeout', type=float,
+                           default=env_number('SUPERVISOR_STARTUP_TIMEOUT', 120, minimum=1),
+                           help='Seconds a new worker has to pass /health')
     
     args = parser.parse_args()
     
@@ -86,10 +142,13 @@ def main():
         'stop': stop_service,
         'restart': restart_service,
         'status': status_service,
-        'setup': setup_service
+        'setup': setup_service,
+        'reload': reload_service
     }
     
-    if args.command in commands:
+    if args.command == 'supervise':
+        supervise_service(args)
+    elif args.command in commands:
         commands[args.command]()
     else:
         parser.print_help()
@@ -21,14 +21,29 @@ is_running() {
     return $?
 }
 
-# Function to start the Flask server
+# Matches a Python interpreter running app.py directly
+APP_PATTERN='python[0-9.]* ([^ ]*/)?app\.py( |$)'
+
+# Function to start the Flask server under the worker supervisor
 start_server() {
     echo "Starting dashboard server..."
-    if is_running "app.py"; then
-        echo "Server already running"
+    if is_running "manage.py supervise"; then
+        echo "Server already running, reloading worker"
+        python3 manage.py reload
+    elif is_running "$APP_PATTERN"; then
+        # Started by an older startup.sh; it holds the port and cannot be reloaded
+        echo "Error: a standalone app.py is running (PID: $(pgrep -f "$APP_PATTERN" | tr '\n' ' '))"
+        echo "Stop it first, then run this script again"
+        exit 1
     else
-        nohup python3 app.py > /dev/null 2>&1 &
-        echo "Server started"
+        nohup python3 manage.py supervise >> supervisor.log 2>&1 &
+        local pid=$!
+        sleep 2
+        if ! kill -0 "$pid" 2> /dev/null; then
+            echo "Error: supervisor failed to start, see supervisor.log"
+            exit 1
+        fi
+        echo "Server started (supervisor PID: $pid)"
     fi
 }
 
@@ -0,0 +1,344 @@
+"""
+Zero-downtime worker supervisor for the Raspberry Pi Server Dashboard
+
+The supervisor owns the listening socket and runs app.py as a child worker
+that inherits it. On reload (SIGHUP) a replacement worker is started, checked
+via /health on a private loopback socket, and only then allowed to accept
+traffic; the old worker stops accepting and drains its in-flight request
+before a deadline. Crashed workers are restarted with exponential backoff.
+
+Runs in the foreground without systemd, so it can be tested locally:
+
+    python3 manage.py supervise --port 5000
+    python3 manage.py reload
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+log_level = os.environ.get('LOG_LEVEL', 'WARNING')
+logging.basicConfig(level=getattr(logging, log_level, logging.WARNING))
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(BASE_DIR, 'app.py')
+PID_FILE = os.environ.get('SUPERVISOR_PID_FILE', os.path.join(BASE_DIR, 'supervisor.pid'))
+
+# Environment handed to workers so they serve the inherited sockets
+LISTEN_FD_ENV = 'MINERVA_LISTEN_FD'
+HEALTH_FD_ENV = 'MINERVA_HEALTH_FD'
+# Keep-warm stats of the previous worker, so a reload neither re-probes a warm
+# model nor resets the counters
+KEEP_WARM_STATE_ENV = 'MINERVA_KEEP_WARM_STATE'
+
+# Line written to a worker's stdin once it passed the health check
+SERVE_COMMAND = b'serve\n'
+
+
+class Worker:
+    """A single app.py child process and its private health socket"""
+
+    def __init__(self, process, health_sock):
+        self.process = process
+        self.health_sock = health_sock
+        self.health_port = health_sock.getsockname()[1]
+        self.started_at = time.monotonic()
+        self.drain_deadline = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def fetch(self, path, timeout=2.0):
+        """GET a JSON endpoint on the worker's private socket, or None on failure"""
+        url = f"http://127.0.0.1:{self.health_port}{path}"
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                if resp.status != 200:
+                    return None
+                return json.loads(resp.read().decode('utf-8'))
+        except (OSError, ValueError) as e:
+            logger.debug(f"GET {path} on worker {self.pid} failed: {e}")
+            return None
+
+    def check_health(self, timeout=2.0):
+        """Return True if the worker answers /health on its private socket"""
+        data = self.fetch('/health', timeout=timeout)
+        return bool(data) and data.get('status') == 'healthy'
+
+    def promote(self):
+        """Tell the worker to start accepting on the shared socket"""
+        try:
+            self.process.stdin.write(SERVE_COMMAND)
+            self.process.stdin.flush()
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not promote worker {self.pid}: {e}")
+            return False
+
+    def drain(self, timeout):
+        """Ask the worker to stop accepting and finish in-flight requests"""
+        self.drain_deadline = time.monotonic() + timeout
+        self.signal(signal.SIGTERM)
+
+    def signal(self, signum):
+        try:
+            self.process.send_signal(signum)
+        except (ProcessLookupError, OSError):
+            pass
+
+    def close(self):
+        """Release supervisor-side resources once the process is gone"""
+        try:
+            self.health_sock.close()
+        except OSError:
+            pass
+        if self.process.stdin:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+
+class DashboardSupervisor:
+    def __init__(self, host='0.0.0.0', port=5000, drain_timeout=30.0,
+                 startup_timeout=120.0, max_backoff=60.0):
+        if not isinstance(port, int) or port < 1 or port > 65535:
+            raise ValueError("Port must be between 1 and 65535")
+        if drain_timeout <= 0 or startup_timeout <= 0 or max_backoff <= 0:
+            raise ValueError("Timeouts must be positive")
+
+        self.host = host
+        self.port = port
+        self.drain_timeout = float(drain_timeout)
+        self.startup_timeout = float(startup_timeout)
+        self.max_backoff = float(max_backoff)
+
+        self.listen_sock = None
+        self.active = None
+        self.draining = []
+        self.backoff = 1.0
+        self.next_start = 0.0
+        self.reload_requested = False
+        self.stop_requested = False
+
+    def bind(self):
+        """Create the listening socket that every worker inherits"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        sock.set_inheritable(True)
+        self.listen_sock = sock
+        logger.info(f"Listening on {self.host}:{self.port}")
+
+    def spawn_worker(self):
+        """Start app.py inheriting the listening socket"""
+        health_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        health_sock.bind(('127.0.0.1', 0))
+        health_sock.listen(8)
+        health_sock.set_inheritable(True)
+
+        env = os.environ.copy()
+        env[LISTEN_FD_ENV] = str(self.listen_sock.fileno())
+        env[HEALTH_FD_ENV] = str(health_sock.fileno())
+        env.pop(KEEP_WARM_STATE_ENV, None)
+        if self.active is not None and self.active.is_alive():
+            state = self.active.fetch('/api/ai-keep-warm')
+            if state and state.get('enabled'):
+                state['snapshot_time'] = time.time()
+                env[KEEP_WARM_STATE_ENV] = json.dumps(state)
+
+        process = subprocess.Popen(
+            [sys.executable, APP_PATH],
+            cwd=BASE_DIR,
+            env=env,
+            stdin=subprocess.PIPE,
+            pass_fds=(self.listen_sock.fileno(), health_sock.fileno())
+        )
+        worker = Worker(process, health_sock)
+        logger.info(f"Spawned worker {worker.pid}")
+        return worker
+
+    def wait_healthy(self, worker):
+        """Poll the worker's /health until it passes or startup times out"""
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline and not self.stop_requested:
+            if not worker.is_alive():
+                return False
+            if worker.check_health():
+                return True
+            self.reap_draining()
+            time.sleep(0.5)
+        return False
+
+    def start_worker(self):
+        """Start a worker and switch traffic to it once healthy"""
+        worker = self.spawn_worker()
+        if not self.wait_healthy(worker) or not worker.promote():
+            logger.error(f"Worker {worker.pid} failed health check")
+            worker.signal(signal.SIGKILL)
+            worker.process.wait()
+            worker.close()
+            return False
+
+        previous = self.active
+        self.active = worker
+        logger.info(f"Worker {worker.pid} is serving")
+        if previous is not None:
+            logger.info(f"Draining worker {previous.pid} (deadline {self.drain_timeout:.0f}s)")
+            previous.drain(self.drain_timeout)
+            self.draining.append(previous)
+        return True
+
+    def reap_draining(self):
+        """Collect drained workers and kill the ones past their deadline"""
+        now = time.monotonic()
+        for worker in list(self.draining):
+            if not worker.is_alive():
+                worker.close()
+                self.draining.remove(worker)
+            elif now >= worker.drain_deadline:
+                logger.warning(f"Worker {worker.pid} missed drain deadline, killing")
+                worker.signal(signal.SIGKILL)
+
+    def check_active(self):
+        """Restart the active worker with backoff if it crashed"""
+        now = time.monotonic()
+        if self.active is not None:
+            if self.active.is_alive():
+                # Reset backoff once a worker has stayed up for a while
+                if now - self.active.started_at > self.max_backoff:
+                    self.backoff = 1.0
+                return
+            logger.error(f"Worker {self.active.pid} exited with code {self.active.process.returncode}")
+            self.active.close()
+            self.active = None
+            self.next_start = now + self.backoff
+            logger.warning(f"Restarting worker in {self.backoff:.0f}s")
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+
+        if now < self.next_start:
+            return
+        if not self.start_worker():
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.next_start = time.monotonic() + self.backoff
+            logger.warning(f"Retrying worker start in {self.backoff:.0f}s")
+
+    def handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self.reload_requested = True
+        else:
+            self.stop_requested = True
+
+    def shutdown(self):
+        """Drain all workers and release the listening socket"""
+        workers = self.draining + ([self.active] if self.active else [])
+        for worker in workers:
+            if worker.drain_deadline is None:
+                worker.drain(self.drain_timeout)
+        for worker in workers:
+            remaining = max(0.0, worker.drain_deadline - time.monotonic())
+            try:
+                worker.process.wait(timeout=remaining)
+            except subprocess.TimeoutExpired:
+                worker.signal(signal.SIGKILL)
+                worker.process.wait()
+            worker.close()
+        self.active = None
+        self.draining = []
+        if self.listen_sock is not None:
+            self.listen_sock.close()
+        remove_pid_file()
+        logger.info("Supervisor stopped")
+
+    def run(self):
+        """Run the supervisor loop until SIGTERM/SIGINT"""
+        signal.signal(signal.SIGHUP, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        if self.listen_sock is None:
+            self.bind()
+        write_pid_file()
+        try:
+            while not self.stop_requested:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    logger.info("Reloading workers")
+                    if not self.start_worker():
+                        logger.error("Reload aborted, keeping current worker")
+                self.check_active()
+                self.reap_draining()
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+
+
+def write_pid_file():
+    with open(PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+
+
+def remove_pid_file():
+    try:
+        os.remove(PID_FILE)
+    except OSError:
+        pass
+
+
+def read_pid_file():
+    """Return the running supervisor's PID, or None"""
+    try:
+        with open(PID_FILE, 'r') as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+        return pid
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def run_worker(app, on_stop=None):
+    """
+    Serve the Flask app on the sockets inherited from the supervisor.
+
+    /health is served on the private socket first; the shared socket is only
+    served after the supervisor writes the serve command to stdin. SIGTERM
+    stops accepting and lets the in-flight request finish before exiting;
+    on_stop is called first so background work stops while draining.
+    """
+    from werkzeug.serving import make_server
+
+    listen_fd = int(os.environ[LISTEN_FD_ENV])
+    health_fd = int(os.environ[HEALTH_FD_ENV])
+
+    health_server = make_server('127.0.0.1', 0, app, fd=health_fd)
+    threading.Thread(target=health_server.serve_forever, daemon=True).start()
+
+    # Wait for the supervisor; EOF means it went away, so do not serve
+    if sys.stdin.buffer.readline() != SERVE_COMMAND:
+        return
+
+    server = make_server('0.0.0.0', 0, app, threaded=False, fd=listen_fd)
+
+    def stop(signum, frame):
+        if on_stop is not None:
+            on_stop()
+        # shutdown() blocks until serve_forever returns, so call it off-thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+        threading.Thread(target=health_server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()